@@ -12,8 +12,16 @@ of the release name on every platform.
 
 from __future__ import annotations
 
+import argparse
+import contextlib
+import hashlib
+import os
+import re
 import shutil
+import stat
+import subprocess
 import sys
+from collections.abc import Iterator
 from pathlib import Path
 
 WORKSPACE_ROOT = Path(__file__).resolve().parents[1]
@@ -29,12 +37,55 @@ from safe_delete import safe_delete  # noqa: E402
 
 RELEASE_ARTIFACT = "kitchensync.exe"
 BIN_NAME = "kitchensync"
+# Crate Cargo.lock files are not inputs: the root build excludes subpjx from
+# its workspace and resolves path dependencies through proj/Cargo.lock.
+SOURCE_SUFFIXES = (".rs", ".toml")
+STAMP_NAME = "build-released.stamp"
+# Environment that changes what cargo and rustc produce, so it is part of the
+# stamp alongside the sources and the compiler version.
+STAMP_ENV_NAMES = ("RUSTFLAGS", "CARGO_ENCODED_RUSTFLAGS", "RUSTC", "RUSTC_WRAPPER")
+STAMP_ENV_PREFIXES = ("CARGO_PROFILE_", "CARGO_BUILD_")
+PGO_DIR = WORKSPACE_ROOT / "proj" / "pgo"
+PGO_PROFILE = PGO_DIR / "kitchensync.profdata"
+PGO_WORKLOAD = WORKSPACE_ROOT / "proj" / "pgo-workload.py"
+# --fast: whole-program LTO in a single codegen unit, tuned for the build host.
+# panic stays "unwind" because worker threads report failures through join().
+FAST_PROFILE_ENV = {
+    "CARGO_PROFILE_RELEASE_LTO": "fat",
+    "CARGO_PROFILE_RELEASE_CODEGEN_UNITS": "1",
+}
+FAST_RUSTFLAGS = ["-Ctarget-cpu=native"]
 
 
-def _reset_released_root() -> None:
-    if tc.RELEASED_ROOT.exists():
-        safe_delete(tc.RELEASED_ROOT)
+def _prune_released_root() -> None:
     tc.RELEASED_ROOT.mkdir(parents=True, exist_ok=True)
+    for entry in tc.RELEASED_ROOT.iterdir():
+        if entry.name != RELEASE_ARTIFACT:
+            safe_delete(entry)
+
+
+def _is_current_copy(built: Path, dest: Path) -> bool:
+    # A hardlink is the same inode; copy2 preserves mtime, so an unchanged
+    # build leaves size and mtime equal.
+    if not dest.is_file():
+        return False
+    built_stat = built.stat()
+    dest_stat = dest.stat()
+    if os.path.samestat(built_stat, dest_stat):
+        return True
+    return (
+        built_stat.st_size == dest_stat.st_size
+        and built_stat.st_mtime_ns == dest_stat.st_mtime_ns
+    )
+
+
+def _link_or_copy(source: Path, dest: Path) -> None:
+    # cargo replaces target/release binaries rather than rewriting them in
+    # place, so a hardlink cannot change under released/.
+    try:
+        os.link(source, dest)
+    except OSError:
+        shutil.copy2(source, dest)
 
 
 def _check_release_specs() -> None:
@@ -47,6 +98,14 @@ def _check_release_specs() -> None:
         )
 
 
+def _write_if_changed(path: Path, text: str) -> None:
+    # Rewriting identical bytes would bump the mtime and make cargo rebuild.
+    data = text.encode("ascii")
+    if path.is_file() and path.read_bytes() == data:
+        return
+    path.write_bytes(data)
+
+
 def _write_release_crate() -> None:
     commandline = WORKSPACE_ROOT / "proj" / "subpjx" / "CommandLine"
     if not (commandline / "Cargo.toml").is_file():
@@ -55,7 +114,8 @@ def _write_release_crate() -> None:
     src = tc.PROJECT_ROOT / "src"
     src.mkdir(parents=True, exist_ok=True)
     rel = commandline.relative_to(tc.PROJECT_ROOT).as_posix()
-    (tc.PROJECT_ROOT / "Cargo.toml").write_text(
+    _write_if_changed(
+        tc.PROJECT_ROOT / "Cargo.toml",
         "\n".join(
             [
                 "[package]",
@@ -82,10 +142,9 @@ def _write_release_crate() -> None:
                 "",
             ]
         ),
-        encoding="ascii",
-        newline="\n",
     )
-    (src / "main.rs").write_text(
+    _write_if_changed(
+        src / "main.rs",
         "\n".join(
             [
                 "use commandline::{CommandLinePeerRole, CommandLineProcessOutput};",
@@ -242,14 +301,13 @@ def _write_release_crate() -> None:
                 "",
             ]
         ),
-        encoding="ascii",
-        newline="\n",
     )
 
 
-def _built_binary() -> Path:
+def _built_binary(target_dir: Path | None = None) -> Path:
     name = BIN_NAME + (".exe" if tc.os_name_is_windows() else "")
-    built = tc.PROJECT_ROOT / "target" / "release" / name
+    target_dir = target_dir or tc.PROJECT_ROOT / "target"
+    built = target_dir / "release" / name
     if not built.is_file():
         raise tc.BuildError(f"no release binary found at {built}")
     return built
@@ -258,28 +316,365 @@ def _built_binary() -> Path:
 def _copy_release_artifact() -> list[str]:
     built = _built_binary()
 
-    _reset_released_root()
     dest = tc.RELEASED_ROOT / RELEASE_ARTIFACT
-    shutil.copy2(built, dest)
+    if not _is_current_copy(built, dest):
+        staged = dest.with_name(dest.name + ".tmp")
+        _link_or_copy(built, staged)
+        os.replace(staged, dest)
     return [f"released/{RELEASE_ARTIFACT}"]
 
 
-def assemble() -> int:
+def _dep_info_inputs() -> list[Path]:
+    """Return every input cargo recorded for the last release build.
+
+    ``target/release/kitchensync.d`` lists the files rustc read, including
+    ones pulled in with ``include_str!`` and friends from outside the crates
+    (``specs/help.md``). Spaces inside paths are escaped as ``\\ ``.
+    """
+    dep_info = tc.PROJECT_ROOT / "target" / "release" / f"{BIN_NAME}.d"
+    try:
+        text = dep_info.read_text(encoding="utf-8")
+    except OSError:
+        return []
+    inputs: list[Path] = []
+    for line in text.splitlines():
+        _, sep, deps = line.partition(": ")
+        if not sep:
+            continue
+        for dep in re.split(r"(?<!\\)\s+", deps.strip()):
+            if dep:
+                inputs.append(Path(dep.replace("\\ ", " ")))
+    return inputs
+
+
+def _source_stats() -> dict[Path, os.stat_result]:
+    # Walk with scandir so target/ directories are pruned unvisited and the
+    # directory-entry type avoids a stat per entry; one stat per source file
+    # then serves the digest. cargo's dep-info adds inputs from outside the
+    # crates that the last build actually read.
+    stats: dict[Path, os.stat_result] = {}
+    stack = [str(WORKSPACE_ROOT / "proj" / "subpjx")]
+    while stack:
+        # A missing or unreadable tree contributes nothing here; the crate
+        # checks in _write_release_crate report it as a BuildError.
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name != "target":
+                        stack.append(entry.path)
+                elif entry.name.endswith(SOURCE_SUFFIXES):
+                    # Files follow symlinks like the old rglob + is_file()
+                    # did; entries that vanish after listing are skipped.
+                    try:
+                        result = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    if stat.S_ISREG(result.st_mode):
+                        stats[Path(entry.path)] = result
+
+    extra = [
+        *_dep_info_inputs(),
+        WORKSPACE_ROOT / "proj" / "Cargo.lock",
+        Path(__file__).resolve(),
+    ]
+    for path in extra:
+        if path in stats:
+            continue
+        try:
+            result = path.stat()
+        except FileNotFoundError:
+            continue
+        if stat.S_ISREG(result.st_mode):
+            stats[path] = result
+    return stats
+
+
+def _rustc_output(*args: str) -> str | None:
+    try:
+        completed = subprocess.run(
+            [os.environ.get("RUSTC", "rustc"), *args],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            check=False,
+        )
+    except OSError:
+        return None
+    return completed.stdout if completed.returncode == 0 else None
+
+
+def _rustc_version() -> str:
+    return _rustc_output("-vV") or "unavailable"
+
+
+def _build_environment() -> list[str]:
+    return sorted(
+        f"{name}={value}"
+        for name, value in os.environ.items()
+        if name in STAMP_ENV_NAMES or name.startswith(STAMP_ENV_PREFIXES)
+    )
+
+
+def _source_digest(variant: str, pgo_profile: Path | None = None) -> str:
+    """Hash the release inputs by path, size, and mtime.
+
+    The generated root crate is derived entirely from this script, so the
+    script itself stands in for it. ``variant`` names the build flavor so a
+    PGO build is never mistaken for a default one, and a PGO build also
+    covers ``pgo_profile``. The compiler version and build-affecting
+    environment cover changes outside the tree.
+    """
+    digest = hashlib.sha256(f"variant={variant}\n".encode("utf-8"))
+    digest.update(f"rustc={_rustc_version()}\n".encode("utf-8"))
+    for entry in _build_environment():
+        digest.update(f"env={entry}\n".encode("utf-8"))
+    if pgo_profile is not None:
+        try:
+            result = pgo_profile.stat()
+            profile = f"{result.st_mtime_ns}\0{result.st_size}"
+        except FileNotFoundError:
+            profile = "missing"
+        digest.update(f"pgo-profile={profile}\n".encode("utf-8"))
+    for path, result in sorted(_source_stats().items()):
+        entry = f"{path.as_posix()}\0{result.st_mtime_ns}\0{result.st_size}\n"
+        digest.update(entry.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _stamp_path() -> Path:
+    return tc.PROJECT_ROOT / "target" / STAMP_NAME
+
+
+def _read_stamp() -> tuple[str, str] | None:
+    # The stamp is one "<variant> <digest>" line.
+    stamp = _stamp_path()
+    if not stamp.is_file():
+        return None
+    fields = stamp.read_text(encoding="ascii").split()
+    if len(fields) != 2:
+        return None
+    return fields[0], fields[1]
+
+
+def _released_variant() -> str | None:
+    stamp = _read_stamp()
+    return stamp[0] if stamp else None
+
+
+def _release_is_current(variant: str, digest: str) -> bool:
+    if not (tc.RELEASED_ROOT / RELEASE_ARTIFACT).is_file():
+        return False
+    return _read_stamp() == (variant, digest)
+
+
+def _write_stamp(variant: str, digest: str) -> None:
+    stamp = _stamp_path()
+    stamp.parent.mkdir(parents=True, exist_ok=True)
+    stamp.write_text(f"{variant} {digest}\n", encoding="ascii", newline="\n")
+
+
+@contextlib.contextmanager
+def _patched_env(overrides: dict[str, str | None]) -> Iterator[None]:
+    # A None value unsets the variable for the duration.
+    previous = {name: os.environ.get(name) for name in overrides}
+    try:
+        for name, value in overrides.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        yield
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def _rustflags(flags: list[str]) -> contextlib.AbstractContextManager[None]:
+    # CARGO_ENCODED_RUSTFLAGS separates flags with 0x1f instead of spaces, so
+    # paths inside flags survive checkouts whose path contains a space.
+    encoded = os.environ.get("CARGO_ENCODED_RUSTFLAGS")
+    if encoded is not None:
+        current = encoded.split("\x1f") if encoded else []
+    else:
+        current = os.environ.get("RUSTFLAGS", "").split()
+    return _patched_env(
+        {
+            "RUSTFLAGS": None,
+            "CARGO_ENCODED_RUSTFLAGS": "\x1f".join([*current, *flags]),
+        }
+    )
+
+
+@contextlib.contextmanager
+def _fast_build() -> Iterator[None]:
+    with _patched_env(FAST_PROFILE_ENV), _rustflags(FAST_RUSTFLAGS):
+        yield
+
+
+def _cargo_build(
+    jobs: int | None,
+    target_dir: Path | None = None,
+    label: str = "build-release",
+) -> None:
+    args = ["build", "--release", "--bin", BIN_NAME]
+    if jobs is not None:
+        args += ["--jobs", str(jobs)]
+    if target_dir is not None:
+        args += ["--target-dir", str(target_dir)]
+    tc.run_cargo(args, label=label, cwd=tc.PROJECT_ROOT)
+
+
+def _llvm_profdata() -> Path:
+    # Prefer rustc's own llvm-tools: a system llvm-profdata from another LLVM
+    # release can write profiles this rustc rejects.
+    sysroot = (_rustc_output("--print", "sysroot") or "").strip()
+    if sysroot:
+        for candidate in sorted(Path(sysroot).glob("lib/rustlib/*/bin/llvm-profdata*")):
+            if candidate.is_file():
+                return candidate
+    found = shutil.which("llvm-profdata")
+    if found:
+        return Path(found)
+    raise tc.BuildError(
+        "llvm-profdata not found; install it with "
+        "`rustup component add llvm-tools-preview`"
+    )
+
+
+def _collect_pgo_profile(jobs: int | None) -> None:
+    raw_dir = tc.PROJECT_ROOT / "target" / "pgo-raw"
+    if raw_dir.exists():
+        safe_delete(raw_dir)
+    raw_dir.mkdir(parents=True)
+
+    instrumented_target = tc.PROJECT_ROOT / "target" / "pgo-instrumented"
+    with _rustflags([f"-Cprofile-generate={raw_dir}"]):
+        _cargo_build(jobs, instrumented_target, label="build-pgo-instrumented")
+
+    instrumented = _built_binary(instrumented_target)
+    workload = subprocess.run(
+        [sys.executable, str(PGO_WORKLOAD), str(instrumented)],
+        check=False,
+    )
+    if workload.returncode != 0:
+        raise tc.BuildError(
+            f"PGO workload failed with exit code {workload.returncode}"
+        )
+
+    PGO_DIR.mkdir(parents=True, exist_ok=True)
+    merge = subprocess.run(
+        [str(_llvm_profdata()), "merge", "-o", str(PGO_PROFILE), str(raw_dir)],
+        check=False,
+    )
+    if merge.returncode != 0:
+        raise tc.BuildError(
+            f"llvm-profdata merge failed with exit code {merge.returncode}"
+        )
+
+
+def _parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="build-released")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="parallel rustc jobs for cargo (default: cargo's own choice)",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="rebuild even when the sources match the last release build",
+    )
+    parser.add_argument(
+        "--fast",
+        action="store_true",
+        help=(
+            "fat LTO, one codegen unit, and -Ctarget-cpu=native; the binary "
+            "only runs on CPUs like the build host, so never ship it"
+        ),
+    )
+    parser.add_argument(
+        "--pgo",
+        action="store_true",
+        help=(
+            "build with profile-guided optimization, collecting "
+            "proj/pgo/kitchensync.profdata first if it does not exist"
+        ),
+    )
+    parser.add_argument(
+        "--pgo-refresh",
+        action="store_true",
+        help="re-collect the PGO profile before building (implies --pgo)",
+    )
+    args = parser.parse_args(argv)
+    args.pgo = args.pgo or args.pgo_refresh
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    return args
+
+
+def assemble(
+    jobs: int | None,
+    force: bool = False,
+    pgo: bool = False,
+    pgo_refresh: bool = False,
+    fast: bool = False,
+) -> int:
     _check_release_specs()
+    variant = "+".join(name for name, on in (("fast", fast), ("pgo", pgo)) if on)
+    variant = variant or "default"
+    digest = _source_digest(variant, PGO_PROFILE if pgo else None)
+    # released/ must hold exactly the one artifact even when nothing rebuilds.
+    _prune_released_root()
+    if not (force or pgo_refresh) and _release_is_current(variant, digest):
+        print(f"build-released: released/{RELEASE_ARTIFACT} is up to date")
+        return 0
+    released = _released_variant()
+    if released is not None and released != variant:
+        print(
+            f"build-released: replacing the {released} release "
+            f"with a {variant} build"
+        )
     _write_release_crate()
-    tc.run_cargo(
-        ["build", "--release", "--bin", BIN_NAME],
-        label="build-release",
-        cwd=tc.PROJECT_ROOT,
-    )
+    with _fast_build() if fast else contextlib.nullcontext():
+        if pgo:
+            if pgo_refresh or not PGO_PROFILE.is_file():
+                _collect_pgo_profile(jobs)
+            use_flags = [
+                f"-Cprofile-use={PGO_PROFILE}",
+                "-Cllvm-args=-pgo-warn-mismatch",
+            ]
+            with _rustflags(use_flags):
+                _cargo_build(jobs)
+        else:
+            _cargo_build(jobs)
     copied = _copy_release_artifact()
+    # Recompute after cargo ran (and outside the --fast overrides): the build
+    # can create proj/Cargo.lock, refresh dep-info, or collect a PGO profile,
+    # and the stamp must match what the next run computes.
+    _write_stamp(variant, _source_digest(variant, PGO_PROFILE if pgo else None))
     print(f"build-released: assembled and built {', '.join(copied)}")
     return 0
 
 
-def main() -> int:
+def main(argv: list[str] | None = None) -> int:
+    args = _parse_args(sys.argv[1:] if argv is None else argv)
     try:
-        return assemble()
+        return assemble(
+            args.jobs,
+            args.force,
+            args.pgo,
+            args.pgo_refresh,
+            args.fast,
+        )
     except tc.BuildError as exc:
         print(f"build-released: {exc}", file=sys.stderr)
         return 2
@@ -0,0 +1,92 @@
+# /// script
+# requires-python = ">=3.11"
+# dependencies = []
+# ///
+
+"""Profile-guided optimization workload for KitchenSync.
+
+``build-released.py --pgo`` runs this script against an instrumented build.
+It drives the executable through the same phases a real group of local peers
+goes through -- first sync from a canon peer, a bidirectional sync after edits
+and deletions on several peers, an idempotent re-run, and a dry run -- so the
+collected profile weights the listing, decision, copy, and snapshot paths.
+"""
+
+from __future__ import annotations
+
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+DIRS = 12
+FILES_PER_DIR = 40
+
+
+def run_kitchensync(exe: Path, args: list[str], cwd: Path) -> None:
+    # Diagnostics go to stdout; at error verbosity they are rare, so let them
+    # stream straight to the terminal instead of buffering them here.
+    completed = subprocess.run(
+        [str(exe), "--verbosity", "error", *args],
+        cwd=str(cwd),
+        stdin=subprocess.DEVNULL,
+        timeout=300,
+        check=False,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(
+            f"kitchensync {' '.join(args)} exited {completed.returncode}"
+        )
+
+
+def populate(peer: Path) -> None:
+    for d in range(DIRS):
+        folder = peer / f"dir{d:02d}" / "nested"
+        folder.mkdir(parents=True, exist_ok=True)
+        for f in range(FILES_PER_DIR):
+            size = 64 + (d * FILES_PER_DIR + f) * 97 % 8192
+            (folder / f"file{f:03d}.bin").write_bytes(bytes([f % 251]) * size)
+
+
+def mutate(peer_a: Path, peer_b: Path) -> None:
+    for d in range(0, DIRS, 3):
+        (peer_a / f"dir{d:02d}" / "nested" / "file000.bin").write_bytes(b"edited\n")
+        (peer_b / f"dir{d:02d}" / "nested" / "file001.bin").unlink()
+    (peer_b / "added-on-b").mkdir()
+    (peer_b / "added-on-b" / "note.txt").write_bytes(b"new on B\n")
+
+
+def workload(exe: Path) -> None:
+    temp_root = Path(tempfile.mkdtemp(prefix="kitchensync-pgo-"))
+    try:
+        peers = [temp_root / name for name in ("A", "B", "C")]
+        for peer in peers:
+            peer.mkdir()
+        populate(peers[0])
+
+        run_kitchensync(exe, ["+A", "B", "C"], temp_root)
+        mutate(peers[0], peers[1])
+        run_kitchensync(exe, ["A", "B", "C"], temp_root)
+        run_kitchensync(exe, ["A", "B", "C"], temp_root)
+        (peers[2] / "dir01" / "nested" / "file002.bin").write_bytes(b"pending\n")
+        run_kitchensync(exe, ["--dry-run", "A", "B", "C"], temp_root)
+    finally:
+        shutil.rmtree(temp_root, ignore_errors=True)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = sys.argv[1:] if argv is None else argv
+    if len(args) != 1:
+        print("usage: pgo-workload.py <kitchensync executable>", file=sys.stderr)
+        return 2
+    try:
+        workload(Path(args[0]))
+    except (OSError, RuntimeError, subprocess.TimeoutExpired) as exc:
+        print(f"pgo-workload: {exc}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
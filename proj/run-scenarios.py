@@ -0,0 +1,210 @@
+# /// script
+# requires-python = ">=3.13"
+# dependencies = []
+# ///
+
+"""KitchenSync scenario runner.
+
+Each ``tests/S-*.py`` scenario is a standalone script that drives
+``released/kitchensync.exe`` inside its own temporary directory and exits 0 on
+success. They share no state, so this runner launches them concurrently and
+reports the results in scenario order.
+
+The release is built once up front through ``build-released.py``, which
+returns immediately when the executable is already current. It is the default
+build unless ``--fast`` or ``--pgo`` asks for that variant. Scenario scratch
+trees are redirected into one suite directory, on RAM-backed ``/dev/shm`` when
+the host has it, and removed together when the run ends.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+
+WORKSPACE_ROOT = Path(__file__).resolve().parents[1]
+TESTS_DIR = WORKSPACE_ROOT / "tests"
+BUILD_SCRIPT = WORKSPACE_ROOT / "proj" / "build-released.py"
+SCENARIO_TIMEOUT_SECONDS = 300
+RAM_TEMP_DIR = Path("/dev/shm")
+# Scenarios run under this interpreter; S-01 uses Path.read_text(newline=...).
+MIN_PYTHON = (3, 13)
+
+
+def _scenarios(selected: list[str]) -> list[Path]:
+    scenarios = sorted(TESTS_DIR.glob("S-*.py"))
+    if not selected:
+        return scenarios
+    by_name = {path.stem: path for path in scenarios}
+    missing = [name for name in selected if name not in by_name]
+    if missing:
+        raise SystemExit(f"run-scenarios: unknown scenario(s): {', '.join(missing)}")
+    return [by_name[name] for name in selected]
+
+
+def _build_release(variant_flags: list[str]) -> bool:
+    build = subprocess.run(
+        [sys.executable, str(BUILD_SCRIPT), *variant_flags],
+        cwd=str(WORKSPACE_ROOT),
+        stdin=subprocess.DEVNULL,
+        check=False,
+    )
+    return build.returncode == 0
+
+
+def _scratch_parent() -> str | None:
+    if RAM_TEMP_DIR.is_dir() and os.access(RAM_TEMP_DIR, os.W_OK | os.X_OK):
+        return str(RAM_TEMP_DIR)
+    return None
+
+
+def _scenario_env(scratch: str) -> dict[str, str]:
+    # Scenarios create their trees with tempfile, which honors these variables.
+    env = dict(os.environ)
+    for name in ("TMPDIR", "TEMP", "TMP"):
+        env[name] = scratch
+    return env
+
+
+def _kill_scenario(process: subprocess.Popen[str]) -> None:
+    # On POSIX the scenario leads its own session, so the kitchensync.exe it
+    # started dies with it instead of writing into the scratch tree.
+    if os.name == "posix":
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    else:
+        process.kill()
+
+
+def _run_scenario(
+    env: dict[str, str], script: Path
+) -> subprocess.CompletedProcess[str]:
+    args = [sys.executable, str(script)]
+    process = subprocess.Popen(
+        args,
+        cwd=str(WORKSPACE_ROOT),
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        encoding="utf-8",
+        errors="replace",
+        start_new_session=os.name == "posix",
+    )
+    try:
+        stdout, stderr = process.communicate(timeout=SCENARIO_TIMEOUT_SECONDS)
+    except subprocess.TimeoutExpired:
+        _kill_scenario(process)
+        # Keep whatever the scenario printed before it hung.
+        try:
+            stdout, stderr = process.communicate(timeout=10)
+        except subprocess.TimeoutExpired:
+            stdout, stderr = "", ""
+        stderr += f"timed out after {SCENARIO_TIMEOUT_SECONDS} seconds\n"
+        return subprocess.CompletedProcess(args, 1, stdout, stderr)
+    return subprocess.CompletedProcess(args, process.returncode, stdout, stderr)
+
+
+def _available_cpus() -> int:
+    # Honor affinity and cgroup-limited CPU sets where the platform reports them.
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0)) or 1
+    return os.cpu_count() or 1
+
+
+def _parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="run-scenarios")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="scenarios to run at once (default: CPUs available to this process)",
+    )
+    parser.add_argument(
+        "--no-build",
+        action="store_true",
+        help="use released/kitchensync.exe as is instead of building it first",
+    )
+    parser.add_argument(
+        "--fast",
+        action="store_true",
+        help="build and test the --fast variant instead of the default build",
+    )
+    parser.add_argument(
+        "--pgo",
+        action="store_true",
+        help="build and test the --pgo variant instead of the default build",
+    )
+    parser.add_argument(
+        "scenarios",
+        nargs="*",
+        metavar="S-NN",
+        help="run only these scenarios (default: all of tests/S-*.py)",
+    )
+    args = parser.parse_args(argv)
+    if args.no_build and (args.fast or args.pgo):
+        parser.error("--fast and --pgo select a build; drop --no-build")
+    if args.jobs is None:
+        args.jobs = _available_cpus()
+    elif args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    return args
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = _parse_args(sys.argv[1:] if argv is None else argv)
+    if sys.version_info < MIN_PYTHON:
+        print(
+            "run-scenarios: scenarios need Python "
+            f"{'.'.join(map(str, MIN_PYTHON))}+; run this through "
+            "`uv run --script` or a newer interpreter",
+            file=sys.stderr,
+        )
+        return 2
+    scenarios = _scenarios(args.scenarios)
+    variant_flags = [
+        flag for flag, on in (("--fast", args.fast), ("--pgo", args.pgo)) if on
+    ]
+    if not args.no_build and not _build_release(variant_flags):
+        print("run-scenarios: release build failed", file=sys.stderr)
+        return 2
+
+    # A killed scenario's children may outlive it where process groups are not
+    # available, so cleanup tolerates entries that are still changing.
+    with tempfile.TemporaryDirectory(
+        prefix="kitchensync-scenarios-",
+        dir=_scratch_parent(),
+        ignore_cleanup_errors=True,
+    ) as scratch:
+        env = _scenario_env(scratch)
+        with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+            results = list(pool.map(partial(_run_scenario, env), scenarios))
+
+    failed = 0
+    for script, result in zip(scenarios, results):
+        if result.returncode == 0:
+            print(f"{script.stem}: ok")
+            continue
+        failed += 1
+        print(f"{script.stem}: FAILED (exit {result.returncode})")
+        for stream in (result.stdout, result.stderr):
+            if stream:
+                print(stream.rstrip("\n"))
+
+    print(f"run-scenarios: {len(scenarios) - failed} passed, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())